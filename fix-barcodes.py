@@ -13,21 +13,32 @@ What it does:
 
 import sys
 import pandas as pd
-import re
+import pyarrow as pa
+
+# Kept as a pattern string (not a compiled re.Pattern) so pandas can hand it to
+# Arrow's regex kernel; compiled patterns are not supported on Arrow columns.
+NON_DIGITS = r"[^0-9]"
+
+def read_csv_as_strings(path):
+    """Read a headerless ';'-separated CSV into Arrow-backed string columns."""
+    # An explicit string dtype keeps leading 0's (no numeric inference); short
+    # rows are padded with NA like the default reader does.
+    return pd.read_csv(path, sep=";", header=None, dtype=pd.ArrowDtype(pa.string()))
 
 def main(inp, outp):
     # Read everything as string so 0's aren’t lost and NaNs are easy to handle
-    df = pd.read_csv(inp, dtype=str, delimiter=";", header=None)
+    df = read_csv_as_strings(inp)
 
-    # Normalize whitespace
-    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # Normalize whitespace (one vectorized pass per column; NaNs pass through)
+    for c in df.columns:
+        df[c] = df[c].str.strip()
 
     # Drop rows that are completely empty
     df = df.dropna(how="all")
 
     # Also drop rows where the first column is empty/NaN (often the blank separators)
     first_col = df.columns[0]
-    df = df[~(df[first_col].isna() | (df[first_col].astype(str).str.strip() == ""))].copy()
+    df = df[~(df[first_col].isna() | df[first_col].str.len().eq(0))].copy()
 
     # Determine the columns that hold the split barcode digits:
     # from the second column to the third-to-last (i.e., ignore the last two columns)
@@ -36,20 +47,14 @@ def main(inp, outp):
 
     digit_cols = df.columns[1:-2]  # second column up to (N-2)
 
-    # Function to join only digits from the row cells, preserving order
-    def join_digits(row):
-        parts = []
-        for c in digit_cols:
-            val = row.get(c)
-            if pd.isna(val):
-                continue
-            # keep only 0-9 (if there could be other characters)
-            digits = re.sub(r"[^0-9]", "", str(val))
-            if digits != "":
-                parts.append(digits)
-        return "".join(parts)
-
-    df["barcode"] = df.apply(join_digits, axis=1)
+    # Join the digit cells column-wise (NaN -> ""), then keep only 0-9 in a single
+    # vectorized pass, preserving order
+    digits = df[digit_cols].fillna("")
+    df["barcode"] = (
+        digits.iloc[:, 0]
+        .str.cat(digits.iloc[:, 1:])
+        .str.replace(NON_DIGITS, "", regex=True)
+    )
 
     # Keep only first column and the new barcode
     out_df = df[[first_col, "barcode"]].reset_index(drop=True)
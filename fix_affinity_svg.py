@@ -32,16 +32,17 @@ Notes
 """
 import sys
 import re
-from copy import deepcopy
 from lxml import etree
 
-NS = {"svg": "http://www.w3.org/2000/svg"}
+_FONT_SIZE_RE = re.compile(r'font-size\s*:\s*([0-9.]+)px')
+_WHITE_SPACE_RE = re.compile(r'white-space\s*:\s*[^;]+;?')
+_DBL_SEMI_RE = re.compile(r';{2,}')
 
 def parse_font_size(style_attr: str):
     """Return font-size in px (float) if present in a style string; else None."""
     if not style_attr:
         return None
-    m = re.search(r'font-size\s*:\s*([0-9.]+)px', style_attr)
+    m = _FONT_SIZE_RE.search(style_attr)
     if m:
         try:
             return float(m.group(1))
@@ -61,12 +62,12 @@ def get_text_x(element):
 
 def clean_white_space_in_style(style_attr: str):
     """Remove any 'white-space: ...' from the style string to avoid conflicts."""
-    if not style_attr:
+    if not style_attr or "white-space" not in style_attr:
         return style_attr
     # remove any white-space: ...; occurrences (conservative)
-    new_style = re.sub(r'white-space\s*:\s*[^;]+;?', '', style_attr)
+    new_style = _WHITE_SPACE_RE.sub('', style_attr)
     # collapse double semicolons
-    new_style = re.sub(r';{2,}', ';', new_style).strip()
+    new_style = _DBL_SEMI_RE.sub(';', new_style).strip()
     # strip leading/trailing semicolons
     new_style = new_style.strip('; ')
     return new_style
@@ -92,7 +93,7 @@ def split_into_tspans(el, text, base_x, line_height_px):
 
 def process_text_node(text_el):
     style_attr = text_el.get("style")
-    font_size = parse_font_size(style_attr) or parse_font_size(text_el.get("style"))
+    font_size = parse_font_size(style_attr)
     # Fallback line height multiplier
     line_height = (font_size or 12.0) * 1.2
     base_x = get_text_x(text_el)
@@ -106,23 +107,27 @@ def process_text_node(text_el):
         if cleaned != style_attr:
             text_el.set("style", cleaned)
 
+    # Collect the existing children first: the tspans appended by a split below
+    # hold single lines and need no rescan.
+    children = list(text_el)
+    changed_any = False
+
     # If direct text contains "\n", split it
     if text_el.text and "\\n" in text_el.text:
         split_into_tspans(text_el, text_el.text, base_x, line_height)
-        return True
+        changed_any = True
 
-    # Otherwise, scan child tspans and fix any that contain "\n"
-    changed_any = False
-    for child in list(text_el):
+    # Also scan the original child tspans and fix any that contain "\n".
+    # (For un-namespaced <text>, which earlier versions visited only once, this
+    # now splits such tspans too instead of leaving them as they were.)
+    for child in children:
         if child.tag.endswith("tspan") and child.text and "\\n" in child.text:
-            # Insert new tspans at the same position as child
-            idx = list(text_el).index(child)
             lines = child.text.split("\\n")
             dy_first = child.get("dy")
             x_child = child.get("x") or base_x
-            # Remove the old child
-            text_el.remove(child)
-            # Rebuild
+            dy_next = f"{(parse_font_size(child.get('style')) or font_size or 12.0) * 1.2}px"
+            # Build the new tspans in place, right before the old child, then drop it
+            # (no index lookups, so this stays linear in the number of children)
             for j, line in enumerate(lines):
                 tspan = etree.Element("tspan")
                 if x_child is not None:
@@ -132,9 +137,10 @@ def process_text_node(text_el):
                     if dy_first:
                         tspan.set("dy", dy_first)
                 else:
-                    tspan.set("dy", f"{(parse_font_size(child.get('style')) or font_size or 12.0) * 1.2}px")
+                    tspan.set("dy", dy_next)
                 tspan.text = line
-                text_el.insert(idx + j, tspan)
+                child.addprevious(tspan)
+            text_el.remove(child)
             changed_any = True
     return changed_any
 
@@ -148,12 +154,10 @@ def main():
     root = tree.getroot()
 
     changed = False
-    # Find all <text> elements in the SVG namespace or any namespace ending with 'text'
-    for text_el in root.xpath('//svg:text', namespaces=NS):
-        if process_text_node(text_el):
-            changed = True
-    # Also handle cases without proper namespace (fallback)
-    for text_el in root.findall(".//{*}text"):
+    # Find all <text> elements in a single walk: '{*}text' matches the SVG namespace as
+    # well as any other/no namespace (fallback). Collect first, since processing
+    # rewrites the children of each match.
+    for text_el in list(root.iter("{*}text")):
         if process_text_node(text_el):
             changed = True
 
@@ -14,9 +14,12 @@ Requirements:
     - Python 3.8+
     - Pillow (PIL fork)
     - NumPy
+    - Numba (optional; enables a fused, multi-threaded pixel kernel)
+    - imagecodecs (optional; faster PNG decode/encode than Pillow)
 
 Install:
     pip install pillow numpy
+    pip install numba imagecodecs  # optional
 
 Examples:
     # Recolor near-black to orange, remove near-white, with default thresholds
@@ -35,6 +38,9 @@ Examples:
     python recolor_png.py /path/to/input_dir -c "#ff6600" --output-dir /path/to/output_dir \
         --suffix _recolored --overwrite
 
+    # Use all CPU cores for a large folder
+    python recolor_png.py /path/to/input_dir -c "#ff6600" --output-dir /path/to/output_dir --jobs 0
+
 Notes:
     - PNG stores un-premultiplied RGBA, so we keep alpha as-is for recolored pixels.
     - For pixels classified as near-white, we set alpha to 0 and also zero the RGB
@@ -42,12 +48,57 @@ Notes:
 """
 
 import argparse
+import functools
 import os
-from typing import Tuple
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from queue import Full, Queue
+from typing import List, Tuple
 
 import numpy as np
 from PIL import Image
 
+# Use the fused Numba kernel when available; otherwise fall back to NumPy.
+USE_NUMBA = False
+try:
+    from numba import njit, prange, set_num_threads
+    USE_NUMBA = True
+except ImportError:
+    pass
+
+# Use imagecodecs (libpng/libspng + zlib-ng/libdeflate) for PNG I/O when available.
+USE_IMAGECODECS = False
+try:
+    import imagecodecs
+    USE_IMAGECODECS = True
+except ImportError:
+    pass
+
+PNG_COMPRESS_LEVEL = 6  # same as Pillow's default
+BAND_BYTES = 1024 * 1024  # RGBA bytes per row band in the NumPy fallback (~L2-sized)
+
+
+if USE_NUMBA:
+    @njit(parallel=True, cache=True, boundscheck=False)
+    def _recolor_kernel(flat, white_min, black_thresh, tr, tg, tb, alpha_min):
+        """In-place single pass over a flat RGBA uint8 buffer (see recolor_array)."""
+        for i in prange(flat.shape[0] // 4):
+            p = 4 * i
+            r = flat[p]
+            g = flat[p + 1]
+            b = flat[p + 2]
+            a = flat[p + 3]
+            if r >= white_min and g >= white_min and b >= white_min:
+                flat[p] = 0
+                flat[p + 1] = 0
+                flat[p + 2] = 0
+                flat[p + 3] = 0
+                r = g = b = a = 0
+            if r <= black_thresh and g <= black_thresh and b <= black_thresh and a > alpha_min:
+                flat[p] = tr
+                flat[p + 1] = tg
+                flat[p + 2] = tb
+
 
 def parse_color(s: str) -> Tuple[int, int, int]:
     """Parse a color string like '#RRGGBB' or 'R,G,B' into an (R,G,B) tuple."""
@@ -77,6 +128,64 @@ def parse_color(s: str) -> Tuple[int, int, int]:
     return (r, g, b)
 
 
+def recolor_array(
+    arr: np.ndarray,
+    target_rgb: Tuple[int, int, int],
+    black_thresh: int,
+    white_thresh: int,
+    exclude_almost_transparent: bool = True,
+    almost_transparent_alpha: int = 0,
+) -> np.ndarray:
+    """
+    In-place version of process_image on an HxWx4 uint8 RGBA array.
+    Every write stays within 0..255, so no wider dtype is needed.
+
+    Returns:
+        The same array, modified in place.
+    """
+    if white_thresh < 0 or white_thresh > 255:
+        raise ValueError("white_thresh must be in 0..255")
+    if black_thresh < 0 or black_thresh > 255:
+        raise ValueError("black_thresh must be in 0..255")
+
+    white_min = 255 - white_thresh
+
+    if USE_NUMBA:
+        # -1 disables the alpha test (every uint8 alpha is > -1)
+        alpha_min = almost_transparent_alpha if exclude_almost_transparent else -1
+        tr, tg, tb = target_rgb
+        # The kernel works on a flat view; reshape() of a non-contiguous array (e.g. a
+        # strided slice) would be a copy, so run on a contiguous copy and write it back.
+        flat = arr if arr.flags.c_contiguous else np.ascontiguousarray(arr)
+        _recolor_kernel(flat.reshape(-1), white_min, black_thresh, tr, tg, tb, alpha_min)
+        if flat is not arr:
+            arr[...] = flat
+        return arr
+
+    # Work in bands of rows so the band and its mask temporaries stay cache-resident
+    # across the white -> black sub-steps instead of streaming the whole image each time.
+    rows = max(1, BAND_BYTES // max(1, arr.shape[1] * 4))
+    for y in range(0, arr.shape[0], rows):
+        band = arr[y:y + rows]
+        rgb = band[..., :3]  # view, reflects the in-place writes below
+
+        # Consider near-white first: these become fully transparent
+        # (set alpha=0 and zero RGB to prevent white fringes).
+        near_white_mask = (rgb >= white_min).all(axis=-1)
+        band[near_white_mask] = 0  # RGBA in one store
+
+        # Near-black mask (preserve alpha), evaluated after white removal so we don't
+        # recolor freshly zeroed pixels. Skip fully transparent pixels, and optionally
+        # skip almost transparent pixels (to avoid recoloring anti-aliased edges with tiny alpha).
+        near_black_mask = (rgb <= black_thresh).all(axis=-1)
+        if exclude_almost_transparent:
+            near_black_mask &= (band[..., 3] > almost_transparent_alpha)
+
+        # Apply recolor for near-black pixels; alpha stays unchanged
+        rgb[near_black_mask] = target_rgb
+    return arr
+
+
 def process_image(
     img: Image.Image,
     target_rgb: Tuple[int, int, int],
@@ -100,54 +209,158 @@ def process_image(
     Returns:
         PIL Image in RGBA.
     """
-    rgba = img.convert("RGBA")
-    arr = np.array(rgba, dtype=np.uint16)  # avoid overflow on writes
-    r = arr[..., 0]
-    g = arr[..., 1]
-    b = arr[..., 2]
-    a = arr[..., 3]
-
-    # Masks
-    # Consider near-white first: these become fully transparent
-    # (set alpha=0 and zero RGB to prevent white fringes).
-    if white_thresh < 0 or white_thresh > 255:
-        raise ValueError("white_thresh must be in 0..255")
-    if black_thresh < 0 or black_thresh > 255:
-        raise ValueError("black_thresh must be in 0..255")
-
-    white_min = 255 - white_thresh
-    near_white_mask = (r >= white_min) & (g >= white_min) & (b >= white_min)
-
-    # Apply near-white removal
-    arr[..., 0][near_white_mask] = 0
-    arr[..., 1][near_white_mask] = 0
-    arr[..., 2][near_white_mask] = 0
-    arr[..., 3][near_white_mask] = 0  # alpha to 0
-
-    # Recompute masks after white removal (so we don't recolor freshly zeroed pixels)
-    r = arr[..., 0]
-    g = arr[..., 1]
-    b = arr[..., 2]
-    a = arr[..., 3]
-
-    # Near-black mask (preserve alpha). Skip fully transparent pixels, and optionally
-    # skip almost transparent pixels (to avoid recoloring anti-aliased edges with tiny alpha).
-    near_black_mask = (r <= black_thresh) & (g <= black_thresh) & (b <= black_thresh)
-    if exclude_almost_transparent:
-        near_black_mask &= (a > almost_transparent_alpha)
-
-    # Apply recolor for near-black pixels
-    tr, tg, tb = target_rgb
-    arr[..., 0][near_black_mask] = tr
-    arr[..., 1][near_black_mask] = tg
-    arr[..., 2][near_black_mask] = tb
-    # alpha stays unchanged
-
-    # Clip back to uint8 range and convert to PIL Image
-    arr = np.clip(arr, 0, 255).astype(np.uint8)
+    arr = np.array(img.convert("RGBA"), dtype=np.uint8)
+    recolor_array(
+        arr,
+        target_rgb,
+        black_thresh,
+        white_thresh,
+        exclude_almost_transparent=exclude_almost_transparent,
+        almost_transparent_alpha=almost_transparent_alpha,
+    )
     return Image.fromarray(arr, mode="RGBA")
 
 
+def load_rgba(path: str) -> np.ndarray:
+    """Decode a PNG into a writable HxWx4 uint8 RGBA array."""
+    if USE_IMAGECODECS:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            arr = imagecodecs.png_decode(data)
+        except Exception:
+            arr = None
+        if arr is not None and arr.dtype == np.uint8 and arr.ndim == 3:
+            if arr.shape[2] == 4:
+                return np.ascontiguousarray(arr)
+            if arr.shape[2] == 3:
+                # Opaque RGB (transparency chunks are expanded to 4 channels)
+                alpha = np.full(arr.shape[:2] + (1,), 255, dtype=np.uint8)
+                return np.concatenate([arr, alpha], axis=-1)
+        # Grayscale, 16-bit, etc.: let Pillow do the RGBA conversion
+    return np.array(Image.open(path).convert("RGBA"), dtype=np.uint8)
+
+
+def save_rgba(arr: np.ndarray, path: str):
+    """Encode an HxWx4 uint8 RGBA array as PNG."""
+    if USE_IMAGECODECS:
+        with open(path, "wb") as f:
+            f.write(imagecodecs.png_encode(arr, level=PNG_COMPRESS_LEVEL))
+        return
+    Image.fromarray(arr, mode="RGBA").save(path, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+
+
+def process_one(in_file: str, out_file: str, args: argparse.Namespace, target: Tuple[int, int, int]):
+    """Recolor a single PNG according to the CLI options in ``args``."""
+    if (not args.overwrite) and os.path.exists(out_file):
+        print(f"Skip (exists): {out_file}")
+        return
+    arr = load_rgba(in_file)
+    _recolor_with_args(arr, args, target)
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    save_rgba(arr, out_file)
+    print(f"Saved: {out_file}")
+
+
+def _recolor_with_args(arr: np.ndarray, args: argparse.Namespace, target: Tuple[int, int, int]):
+    recolor_array(
+        arr,
+        target_rgb=target,
+        black_thresh=args.black_thresh,
+        white_thresh=args.white_thresh,
+        exclude_almost_transparent=(not args.keep_very_transparent),
+        almost_transparent_alpha=args.almost_transparent_alpha,
+    )
+
+
+_DONE = object()  # end-of-stream marker for the pipeline queues
+
+
+def process_pipelined(
+    in_files: List[str],
+    out_files: List[str],
+    args: argparse.Namespace,
+    target: Tuple[int, int, int],
+    queue_size: int = 4,
+):
+    """
+    Serial batch with PNG decode/encode overlapped with the pixel kernel:
+    a reader thread decodes the next files while the calling thread recolors,
+    and a writer thread encodes finished ones. The codecs release the GIL, and
+    the bounded queues keep at most a few images in memory.
+    """
+    work_q = Queue(maxsize=queue_size)
+    write_q = Queue(maxsize=queue_size)
+    write_errors = []
+    stop = threading.Event()  # set once the main loop gives up; the reader then exits
+
+    def put_work(item):
+        # Bounded put that gives up when the batch is aborted, so the reader never
+        # stays blocked on a queue nobody reads any more
+        while not stop.is_set():
+            try:
+                work_q.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def reader():
+        for in_file, out_file in zip(in_files, out_files):
+            if stop.is_set():
+                return
+            if (not args.overwrite) and os.path.exists(out_file):
+                print(f"Skip (exists): {out_file}")
+                continue
+            try:
+                put_work((out_file, load_rgba(in_file)))
+            except Exception as e:
+                put_work((out_file, e))
+                return
+        put_work(_DONE)
+
+    def writer():
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                return
+            out_file, arr = item
+            if write_errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                os.makedirs(os.path.dirname(out_file), exist_ok=True)
+                save_rgba(arr, out_file)
+                print(f"Saved: {out_file}")
+            except Exception as e:
+                write_errors.append(e)
+
+    # Daemon threads: an error in the main loop must not leave the reader blocked on a full queue
+    threading.Thread(target=reader, daemon=True).start()
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    writer_thread.start()
+    try:
+        while True:
+            item = work_q.get()
+            if item is _DONE or write_errors:
+                break  # done, or a write failed: stop decoding the rest
+            out_file, arr = item
+            if isinstance(arr, Exception):
+                raise arr
+            _recolor_with_args(arr, args, target)
+            write_q.put((out_file, arr))
+    finally:
+        stop.set()
+        write_q.put(_DONE)
+        writer_thread.join()
+    if write_errors:
+        raise write_errors[0]
+
+
+def _init_worker():
+    # Parallelism comes from the process pool; avoid oversubscribing with Numba threads.
+    if USE_NUMBA:
+        set_num_threads(1)
+
+
 def build_argparser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Recolor near-black to a target color and remove near-white to transparent.")
     p.add_argument("input", help="Input PNG file path OR a directory containing PNGs.")
@@ -170,6 +383,13 @@ def build_argparser() -> argparse.ArgumentParser:
         default=0,
         help="Alpha threshold (0..255) under which recolor is skipped when not using --keep-very-transparent. Default: 0."
     )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="When INPUT is a directory, process this many files in parallel (0 = one per CPU core). Default: 1."
+    )
     return p
 
 
@@ -180,50 +400,39 @@ def main():
     in_path = args.input
     target = parse_color(args.target_color)
 
-    def process_one(in_file: str, out_file: str):
-        img = Image.open(in_file)
-        out = process_image(
-            img,
-            target_rgb=target,
-            black_thresh=args.black_thresh,
-            white_thresh=args.white_thresh,
-            exclude_almost_transparent=(not args.keep_very_transparent),
-            almost_transparent_alpha=args.almost_transparent_alpha,
-        )
-        os.makedirs(os.path.dirname(out_file), exist_ok=True)
-        if (not args.overwrite) and os.path.exists(out_file):
-            print(f"Skip (exists): {out_file}")
-            return
-        out.save(out_file, format="PNG")
-        print(f"Saved: {out_file}")
-
     if os.path.isdir(in_path):
         # Directory mode
         if not args.output_dir:
             raise SystemExit("When INPUT is a directory, you must provide --output-dir.")
         input_dir = in_path
         output_dir = args.output_dir
-        patterns = [".png", ".PNG", ".Png", ".pNg", ".pnG"]
         candidates = []
         if args.recursive:
             for root, _, files in os.walk(input_dir):
                 for fn in files:
-                    if any(fn.endswith(ext) for ext in patterns):
+                    if fn.lower().endswith(".png"):
                         candidates.append(os.path.join(root, fn))
         else:
-            for fn in os.listdir(input_dir):
-                if any(fn.endswith(ext) for ext in patterns):
-                    candidates.append(os.path.join(input_dir, fn))
+            # scandir yields the entry type from the directory listing itself (no extra stat)
+            with os.scandir(input_dir) as it:
+                candidates = [e.path for e in it if e.is_file() and e.name.lower().endswith(".png")]
         if not candidates:
             print("No PNG files found to process.")
             return
+        out_files = []
         for src in candidates:
             rel = os.path.relpath(src, input_dir)
             base, _ = os.path.splitext(rel)
             # If --output provided, treat it as a pattern is not supported in dir mode
             # Construct output path in output_dir mirroring structure
-            out_file = os.path.join(output_dir, base + args.suffix + ".png")
-            process_one(src, out_file)
+            out_files.append(os.path.join(output_dir, base + args.suffix + ".png"))
+        jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+        if jobs == 1:
+            process_pipelined(candidates, out_files, args, target)
+        else:
+            worker = functools.partial(process_one, args=args, target=target)
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as ex:
+                list(ex.map(worker, candidates, out_files))
     else:
         # Single-file mode
         if not os.path.isfile(in_path):
@@ -232,7 +441,7 @@ def main():
         if not out_path:
             base, _ = os.path.splitext(in_path)
             out_path = f"{base}{args.suffix}.png"
-        process_one(in_path, out_path)
+        process_one(in_path, out_path, args, target)
 
 
 if __name__ == "__main__":
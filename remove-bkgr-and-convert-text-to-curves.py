@@ -2,12 +2,22 @@ import os
 import re
 import argparse
 import subprocess
+import selectors
 import tempfile
 import shutil
-import xml.etree.ElementTree as ET
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lxml import etree
 
 SVG_NS = "http://www.w3.org/2000/svg"
-ET.register_namespace("", SVG_NS)
+# Compiled once; lxml evaluates it in C and keeps parent links, so no parent map is needed
+RECT_XPATH = etree.XPath(".//svg:rect", namespaces={"svg": SVG_NS})
+
+_WHITE_LITERALS = frozenset({"#fff", "#ffffff", "white"})
+_RGB_WHITE_RE = re.compile(r"rgb\(\s*255\s*,\s*255\s*,\s*255\s*\)")
+# Seconds to wait for the Inkscape shell prompt before the shell is considered stuck
+INKSCAPE_TIMEOUT = 120.0
 
 def which_inkscape():
     p = shutil.which("inkscape")
@@ -22,9 +32,12 @@ def is_white(color: str) -> bool:
     if not color:
         return False
     c = color.strip().lower()
-    if c in ("#fff", "#ffffff", "white"):
+    if c in _WHITE_LITERALS:
         return True
-    return bool(re.fullmatch(r"rgb\(\s*255\s*,\s*255\s*,\s*255\s*\)", c))
+    # Only rgb(...) values can still be white; skip the regex for everything else
+    if not c.startswith("rgb"):
+        return False
+    return bool(_RGB_WHITE_RE.fullmatch(c))
 
 def parse_viewbox(vb: str):
     try:
@@ -93,15 +106,13 @@ def remove_background_rects(tree):
     if not canvas:
         return 0
     removed = 0
-    # Build parent map (xml.etree lacks getparent)
-    parent_map = {c: p for p in tree.getroot().iter() for c in list(p)}
     # Check rects at any depth
-    for rect in root.findall(".//{http://www.w3.org/2000/svg}rect"):
+    for rect in RECT_XPATH(root):
         fill = get_fill(rect)
         if not is_white(fill):
             continue
         if rect_covers_canvas(rect, canvas):
-            parent = parent_map.get(rect)
+            parent = rect.getparent()
             if parent is not None:
                 parent.remove(rect)
                 removed += 1
@@ -111,34 +122,91 @@ def remove_background_rects(tree):
                 removed += 1
     return removed
 
-def inkscape_text_to_path(ink, in_svg, out_svg):
-    cmd = [
-        ink,
-        "--export-type=svg",
-        "--export-plain-svg",
-        "--export-text-to-path",
-        f"--export-filename={out_svg}",
-        in_svg,
+def _read_until_prompt(shell, timeout=INKSCAPE_TIMEOUT):
+    # The shell prints "> " at the start of a line once it is ready for the next command.
+    # Read raw chunks against a deadline: if the prompt never shows up (another Inkscape
+    # build, a stuck export) the shell is killed instead of hanging the worker forever.
+    fd = shell.stdout.fileno()
+    deadline = time.monotonic() + timeout
+    out = bytearray()
+    with selectors.DefaultSelector() as sel:
+        sel.register(fd, selectors.EVENT_READ)
+        while not (out == b"> " or out.endswith(b"\n> ")):
+            left = deadline - time.monotonic()
+            if left <= 0 or not sel.select(left):
+                shell.kill()
+                shell.wait()
+                raise TimeoutError(f"Inkscape shell gave no prompt within {timeout:g}s; killed it.")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise RuntimeError("Inkscape shell exited unexpectedly.")
+            out += chunk
+    return out[:-2].decode(errors="replace")
+
+def start_inkscape_shell(ink, timeout=INKSCAPE_TIMEOUT):
+    """Start a persistent `inkscape --shell` session (Inkscape >= 1.0) so startup is paid once per batch."""
+    shell = subprocess.Popen(
+        [ink, "--shell"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    _read_until_prompt(shell, timeout)
+    return shell
+
+def stop_inkscape_shell(shell):
+    try:
+        shell.stdin.write("quit\n")
+        shell.stdin.close()
+        shell.wait(timeout=10)
+    except Exception:
+        shell.kill()
+        shell.wait()
+
+def inkscape_text_to_path(shell, in_svg, out_svg, timeout=INKSCAPE_TIMEOUT):
+    if shell.poll() is not None:
+        raise RuntimeError("Inkscape shell is not running.")
+    actions = [
+        f"file-open:{in_svg}",
+        "export-type:svg",
+        "export-plain-svg",
+        "export-text-to-path",
+        f"export-filename:{out_svg}",
+        "export-do",
+        "file-close",
     ]
-    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    shell.stdin.write("; ".join(actions) + "\n")
+    shell.stdin.flush()
+    _read_until_prompt(shell, timeout)
+    # The shell has no per-command exit status; the exported file is the success signal
+    if not os.path.exists(out_svg):
+        raise RuntimeError(f"Inkscape did not export {in_svg}")
 
-def process_file(path_in, path_out, do_remove_bg=False, do_text_to_path=False, ink=None):
+def process_file(path_in, path_out, do_remove_bg=False, do_text_to_path=False, shell=None,
+                 timeout=INKSCAPE_TIMEOUT):
     tmpdir = tempfile.mkdtemp(prefix="svgproc_")
     try:
         stage = path_in
         # Optional: remove white full-canvas background
         if do_remove_bg:
-            tree = ET.parse(stage)
+            parser = etree.XMLParser(huge_tree=True, remove_blank_text=False)
+            tree = etree.parse(stage, parser)
             removed = remove_background_rects(tree)
             stage1 = os.path.join(tmpdir, "stage1.svg")
             tree.write(stage1, encoding="utf-8", xml_declaration=True)
             stage = stage1
         # Optional: convert text to paths with Inkscape
         if do_text_to_path:
-            if not ink:
+            if shell is None:
                 raise RuntimeError("Inkscape not found; install it or omit --text-to-path.")
+            if any(c in stage for c in ";\n"):
+                # ';' separates shell actions, so keep such paths out of the command line
+                stage0 = os.path.join(tmpdir, "stage0.svg")
+                shutil.copyfile(stage, stage0)
+                stage = stage0
             stage2 = os.path.join(tmpdir, "stage2.svg")
-            inkscape_text_to_path(ink, stage, stage2)
+            inkscape_text_to_path(shell, os.path.abspath(stage), stage2, timeout)
             stage = stage2
         # Final copy
         if stage != path_out:
@@ -155,6 +223,11 @@ def main():
     ap.add_argument("--inplace", action="store_true", help="Modify files in place")
     ap.add_argument("--remove-bg", action="store_true", help="Remove white full-canvas background rect")
     ap.add_argument("--text-to-path", action="store_true", help="Convert all <text> to curves (requires Inkscape)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                    help="Number of files processed in parallel, each worker with its own Inkscape shell (default: CPU count)")
+    ap.add_argument("--timeout", type=float, default=INKSCAPE_TIMEOUT,
+                    help="Seconds to wait for Inkscape per file before killing and restarting its shell "
+                         f"(default: {INKSCAPE_TIMEOUT:g})")
     args = ap.parse_args()
 
     ink = None
@@ -168,28 +241,56 @@ def main():
     out_dir = args.input_dir if args.inplace else args.output_dir
     os.makedirs(out_dir, exist_ok=True)
 
-    total = ok = 0
-    for name in os.listdir(in_dir):
-        if not name.lower().endswith(".svg"):
-            continue
-        total += 1
+    with os.scandir(in_dir) as it:
+        names = [e.name for e in it if e.is_file() and e.name.lower().endswith(".svg")]
+    ops = []
+    if args.remove_bg: ops.append("bg-removed")
+    if args.text_to_path: ops.append("text→paths")
+    suffix = f" ({', '.join(ops)})" if ops else " (copied)"
+
+    # One persistent Inkscape shell per worker thread; all of them are shut down at the end
+    shells = []
+    shells_lock = threading.Lock()
+    local = threading.local()
+
+    def get_shell():
+        shell = getattr(local, "shell", None)
+        if shell is None or shell.poll() is not None:
+            # (Re)start the shell lazily, e.g. after Inkscape crashed or timed out on a previous file
+            shell = start_inkscape_shell(ink, args.timeout)
+            local.shell = shell
+            with shells_lock:
+                shells.append(shell)
+        return shell
+
+    def run(name):
         src = os.path.join(in_dir, name)
         dst = src if args.inplace else os.path.join(out_dir, name)
-        try:
-            process_file(
-                src, dst,
-                do_remove_bg=args.remove_bg,
-                do_text_to_path=args.text_to_path,
-                ink=ink
-            )
-            ok += 1
-            ops = []
-            if args.remove_bg: ops.append("bg-removed")
-            if args.text_to_path: ops.append("text→paths")
-            suffix = f" ({', '.join(ops)})" if ops else " (copied)"
-            print(f"[OK] {name}{suffix}")
-        except Exception as e:
-            print(f"[FAIL] {name}: {e}")
+        process_file(
+            src, dst,
+            do_remove_bg=args.remove_bg,
+            do_text_to_path=args.text_to_path,
+            shell=get_shell() if ink else None,
+            timeout=args.timeout,
+        )
+
+    total = len(names)
+    ok = 0
+    try:
+        # Threads suffice: lxml parsing/serialization and waiting on Inkscape release the GIL
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+            futures = {ex.submit(run, name): name for name in names}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    fut.result()
+                    ok += 1
+                    print(f"[OK] {name}{suffix}")
+                except Exception as e:
+                    print(f"[FAIL] {name}: {e}")
+    finally:
+        for shell in shells:
+            stop_inkscape_shell(shell)
 
     print(f"Done. Processed {total} SVGs; successful: {ok}.")
 
@@ -10,82 +10,56 @@ Usage:
 Notes:
 - Works whether the text is in <text> directly or inside <tspan>s.
 - Leaves all other content unchanged.
-- Writes a timestamped backup next to the input file before saving.
+- When overwriting the input, keeps a timestamped backup next to it (--no-backup to skip).
+- Output is written to a temp file and moved into place, so a failed write
+  never leaves a half-written SVG.
+- Keeps the original layout of the file; --pretty re-indents the output.
+- Requires lxml (pip install lxml).
+- --streaming rewrites the file without loading it whole (for very large SVGs).
 """
 
 import argparse
 import datetime as _dt
+import os
 import shutil
 import sys
+import tempfile
+from contextlib import ExitStack
+from itertools import chain, repeat
 from pathlib import Path
 
-# Prefer built-in ElementTree; you can switch to lxml.etree if installed.
-USE_LXML = False
-try:
-    import lxml.etree as ET  # type: ignore
-    USE_LXML = True
-except ImportError:
-    import xml.etree.ElementTree as ET  # type: ignore
+# lxml (libxml2) parses and serializes in C, much faster than the stdlib ElementTree
+# on multi-MB Affinity exports.
+from lxml import etree
 
 
 SVG_NS = "http://www.w3.org/2000/svg"
 XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
 NSMAP = {"svg": SVG_NS, "xlink": XLINK_NS}
 
-def localname(tag):
-    return tag.split("}")[-1] if "}" in tag else tag
-
-def _register_namespaces():
-    # Ensures namespaces are preserved on write
-    try:
-        ET.register_namespace("", SVG_NS)
-        ET.register_namespace("xlink", XLINK_NS)
-    except Exception:
-        pass
-
-
-def _find_by_id(root, elem_id):
-    """
-    Find any element with the given id, regardless of tag/namespace.
-    """
-    # XPath works with both ET and lxml as long as we pass namespaces when needed.
-    # .//*[@id='Title']
-    return root.find(f".//*[@id='{elem_id}']")
-
-
-def _find_text_or_tspan_descendant(elem):
-    # Depth-first search: return the first descendant that is a <text> or <tspan>
-    stack = list(elem)
-    while stack:
-        node = stack.pop(0)
-        ln = localname(node.tag)
-        if ln in ("text", "tspan"):
-            return node
-        # enqueue children
-        stack[0:0] = list(node)
-    return None
-
-# Helper to clear .text and all child tspan texts for every descendant <text>/<tspan>
-def _clear_all_text_descendants(elem, except_node=None):
-    """Clear .text and all child tspan texts for every descendant <text>/<tspan>
-    except the provided node. Also clears .tail on children to avoid stray spaces."""
-    def ln(tag):
-        return tag.split('}')[-1] if '}' in tag else tag
-    stack = list(elem)
-    while stack:
-        node = stack.pop(0)
-        if node is except_node:
-            stack[0:0] = list(node)
-            continue
-        if ln(node.tag) in ("text", "tspan"):
-            node.text = ""
-            # clear tspans if any
-            for ch in list(node):
-                ch.text = ""
-                ch.tail = ""
-            node.tail = ""
-        # enqueue children
-        stack[0:0] = list(node)
+# Clark-notation tags as stored by lxml, so tag checks are plain string compares
+TEXT_TAG = f"{{{SVG_NS}}}text"
+TSPAN_TAG = f"{{{SVG_NS}}}tspan"
+G_TAG = f"{{{SVG_NS}}}g"
+TSPAN_TAGS = frozenset((TSPAN_TAG, "tspan"))
+# lxml tag filters for SVG or un-namespaced ("{}") text/tspan elements
+TEXT_OR_TSPAN_FILTER = (TEXT_TAG, TSPAN_TAG, "{}text", "{}tspan")
+
+def svg_tag(tag):
+    # Un-namespaced tags are treated as SVG; only a startswith test, no split
+    return tag if tag.startswith("{") else f"{{{SVG_NS}}}{tag}"
+
+
+def _clear_text_node(node):
+    """Clear .text and .tail of a <text>/<tspan> and of its direct children
+    (tspans), so nothing of the old content stays visible."""
+    node.text = ""
+    # clear tspans if any
+    for ch in node:
+        ch.text = ""
+        ch.tail = ""
+    node.tail = ""
 
 
 def _set_text(elem, value: str):
@@ -100,46 +74,57 @@ def _set_text(elem, value: str):
         lines will be distributed across existing tspans. Otherwise, the value
         goes into a single node (no new tspans created).
     """
-    tag = localname(elem.tag)
-
-    if tag == "g":
-        # Some exporters (Affinity) assign IDs to groups; find a nested text/tspan.
-        original_group = elem  # keep a reference before reassigning
-        target = _find_text_or_tspan_descendant(elem)
+    tag = svg_tag(elem.tag)
+
+    if tag == G_TAG:
+        # Some exporters (Affinity) assign IDs to groups; the first nested text/tspan
+        # (document order) receives the value. Every other text/tspan in the group is
+        # cleared in the same walk so we don't append visually.
+        target = None
+        for node in elem.iterdescendants(*TEXT_OR_TSPAN_FILTER):
+            if target is None:
+                target = node
+            else:
+                _clear_text_node(node)
         if target is None:
             # Nothing to set inside this group
             return
-        # Clear any other text/tspan nodes inside the group so we don't append visually
-        _clear_all_text_descendants(original_group, except_node=target)
         elem = target
-        tag = localname(elem.tag)
+        tag = svg_tag(elem.tag)
 
     # Helper to clear text of all children tspans
     def _children_tspans(e):
-        return [c for c in list(e) if localname(c.tag) == "tspan"]
+        return (c for c in e if c.tag in TSPAN_TAGS)
 
     # If the element itself is a tspan
-    if tag == "tspan":
+    if tag == TSPAN_TAG:
         _apply_value_to_node(elem, value)
         return
 
     # If the element is a text node
-    if tag == "text":
+    if tag == TEXT_TAG:
         tspans = _children_tspans(elem)
-        if not tspans:
+        first = next(tspans, None)
+        if first is None:
             # Simple case: no tspans, just write text
             elem.text = value
         else:
             # If value has multiple lines and there are multiple tspans,
             # distribute across existing tspans; extra tspans get blanked.
-            lines = value.split("\n")
-            for i, tspan in enumerate(tspans):
-                _apply_value_to_node(tspan, lines[i] if i < len(lines) else "")
+            # _apply_value_to_node also clears each tspan.tail (no prefixed spaces).
+            if "\n" not in value:
+                _apply_value_to_node(first, value)
+                for tspan in tspans:
+                    _apply_value_to_node(tspan, "")
+            else:
+                # Pad with "" so tspans beyond the last line are blanked; lines
+                # beyond the last tspan are dropped (zip stops with the tspans).
+                lines = iter(value.split("\n"))
+                _apply_value_to_node(first, next(lines))
+                for tspan, line in zip(tspans, chain(lines, repeat(""))):
+                    _apply_value_to_node(tspan, line)
             # Also clear any direct .text on <text> (to avoid stray text)
             elem.text = None
-            # Clear any tspan.tail to avoid prefixed spaces
-            for tspan in tspans:
-                tspan.tail = ""
         return
 
     # If some other element accidentally has the ID, try to set .text anyway
@@ -153,36 +138,214 @@ def _apply_value_to_node(node, value: str):
     to avoid stray whitespace from the original export.
     """
     node.text = value
-    for child in list(node):
+    for child in node:
         child.text = ""
         child.tail = ""
     node.tail = ""
 
 
-def set_text_by_id(root, field_id: str, value: str) -> bool:
-    elem = _find_by_id(root, field_id)
-    if elem is None:
-        return False
-    _set_text(elem, value)
-    return True
+def update_fields(root, updates: dict) -> set:
+    """
+    Apply ``{id: value}`` updates in a single walk of the tree, stopping as soon
+    as every id has been found. Like ``.//*[@id=...]``, only elements below the
+    root are matched and the first occurrence in document order wins.
+
+    Returns the set of ids that were found.
+    """
+    remaining = dict(updates)
+    found = set()
+    for elem in root.iterdescendants():
+        elem_id = elem.get("id")
+        if elem_id in remaining:
+            _set_text(elem, remaining.pop(elem_id))
+            found.add(elem_id)
+            if not remaining:
+                break
+    return found
+
+
+def _free_written(node):
+    # Drop the content of a node that has been written, plus its already-written
+    # previous siblings, so memory stays bounded by the open ancestors.
+    node.clear(keep_tail=True)
+    parent = node.getparent()
+    if parent is not None:
+        while node.getprevious() is not None:
+            del parent[0]
+
+
+def _declared_nsmap(node, scope):
+    # Namespaces to declare when writing node: only those not already in ``scope``
+    # (the prefixes declared on the open ancestors in the output).
+    # lxml's xmlfile also needs an explicit binding for xml:* attributes (xml:space);
+    # it is only added where no ancestor has declared it yet.
+    nsmap = {k: v for k, v in node.nsmap.items() if scope.get(k) != v}
+    if "xml" not in scope and any(name.startswith(f"{{{XML_NS}}}") for name in node.attrib):
+        nsmap["xml"] = XML_NS
+    return nsmap
+
+
+def _write_subtree(xf, node, scope):
+    # Element-by-element so namespaces already declared on the open ancestors are
+    # not repeated (xf.write(node) would redeclare every in-scope namespace).
+    declared = _declared_nsmap(node, scope)
+    scope = {**scope, **declared}
+    with xf.element(node.tag, dict(node.attrib), nsmap=declared):
+        if node.text:
+            xf.write(node.text)
+        for child in node:
+            if isinstance(child.tag, str):
+                _write_subtree(xf, child, scope)
+                if child.tail:
+                    xf.write(child.tail)
+            else:
+                xf.write(child)  # comment/PI, written with its tail
+
+
+def _replace_with(tmp_name, out_path: Path, like: Path):
+    # mkstemp files are private (0600); keep the mode of the file being replaced,
+    # or of the input when writing a new file, then swap atomically.
+    shutil.copymode(out_path if out_path.exists() else like, tmp_name)
+    os.replace(tmp_name, out_path)
+
+
+def _stream_copy(xf, events, root, remaining, found):
+    # Copy the content of ``root`` (its start event has been consumed) from the
+    # iterparse ``events`` up to its end tag. Open elements are kept on an explicit
+    # stack rather than in recursive calls, so nesting depth is not limited by
+    # Python's recursion limit. A child carrying one of the ids in ``remaining`` is
+    # buffered until its end, updated with _set_text and written whole.
+    declared = _declared_nsmap(root, {})
+    open_elems = []  # (element, writer context, namespace scope) being streamed
+
+    def open_element(node, ctx, scope):
+        ctx.__enter__()
+        open_elems.append((node, ctx, scope))
+
+    try:
+        open_element(root, xf.element(root.tag, dict(root.attrib), nsmap=declared), declared)
+        pending = (root, "text")  # text/tail are only complete at the next event
+        for event, node in events:
+            value = getattr(*pending)
+            if value:
+                xf.write(value)
+            if event == "end":
+                open_elems.pop()[1].__exit__(None, None, None)
+                if not open_elems:
+                    return  # root's end tag
+            elif event == "start":
+                scope = open_elems[-1][2]
+                if remaining and node.get("id") in remaining:
+                    for ev, elem in events:
+                        if ev == "end" and elem is node:
+                            break
+                    for elem in node.iter():
+                        elem_id = elem.get("id")
+                        if elem_id in remaining:
+                            _set_text(elem, remaining.pop(elem_id))
+                            found.add(elem_id)
+                    _write_subtree(xf, node, scope)
+                else:
+                    declared = _declared_nsmap(node, scope)
+                    open_element(node, xf.element(node.tag, dict(node.attrib), nsmap=declared),
+                                 {**scope, **declared})
+                    pending = (node, "text")
+                    continue
+            else:
+                # Comment/PI; its tail follows separately once complete
+                tail, node.tail = node.tail, None
+                xf.write(node)
+                node.tail = tail
+            pending = (node, "tail")
+            _free_written(node)
+    except BaseException:
+        # Exit the still-open element contexts, innermost first, with the error
+        with ExitStack() as unwind:
+            for _, ctx, _ in open_elems:
+                unwind.push(ctx)
+            raise
+
+
+def stream_update(in_path: Path, out_path: Path, updates: dict, before_replace=None) -> set:
+    """
+    Streaming counterpart of parse + update_fields + write for very large SVGs.
+
+    Elements are copied to the output as they are parsed (iterparse + an
+    incremental xmlfile writer). Only a subtree whose root carries one of the
+    ids in ``updates`` is buffered until its end tag, updated with _set_text and
+    written in one go; once every id has been seen the rest is copied without
+    further inspection. The result is written to a temp file next to
+    ``out_path`` and moved into place, so ``in_path`` may equal ``out_path``.
+    ``before_replace``, if given, is called once the output is complete and just
+    before it is moved into place (e.g. to back up the file being replaced).
+
+    Returns the set of ids that were found.
+    """
+    remaining = dict(updates)
+    found = set()
+    events = etree.iterparse(
+        str(in_path), events=("start", "end", "comment", "pi"),
+        remove_blank_text=False, huge_tree=True,
+    )
+    # Resolve symlinks so the file they point to is replaced, not the link itself
+    out_path = out_path.resolve()
+    fd, tmp_name = tempfile.mkstemp(dir=out_path.parent, suffix=".svg")
+    os.close(fd)
+    try:
+        with etree.xmlfile(tmp_name, encoding="UTF-8") as xf:
+            xf.write_declaration()
+            # Comments/PIs before the root, then the root itself
+            for event, root in events:
+                if event == "start":
+                    break
+                xf.write(root)
+            doctype = root.getroottree().docinfo.doctype
+            if doctype:
+                xf.write_doctype(doctype)
+            # Like the in-memory path, ids are only matched below the root
+            _stream_copy(xf, events, root, remaining, found)
+            # Comments/PIs after the root; xmlfile cannot write those
+            trailing = [node for _, node in events]
+        if trailing:
+            with open(tmp_name, "ab") as f:
+                for node in trailing:
+                    f.write(b"\n" + etree.tostring(node, encoding="UTF-8", with_tail=False))
+        if before_replace is not None:
+            before_replace()
+        _replace_with(tmp_name, out_path, in_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return found
 
 
 def backup_file(path: Path) -> Path:
     stamp = _dt.datetime.now().strftime("%Y%m%d-%H%M%S")
     backup = path.with_suffix(f".backup-{stamp}.svg")
-    shutil.copy2(path, backup)
+    # The new content is moved in with os.replace (a new inode), so a hard link
+    # keeps the old bytes without copying them; copy when linking is not possible.
+    # Link the resolved file: linking a symlink would only copy the link.
+    src = path.resolve()
+    try:
+        os.link(src, backup)
+    except OSError:
+        shutil.copy2(src, backup)
     return backup
 
 
 def main():
-    _register_namespaces()
-
     ap = argparse.ArgumentParser(description="Update SVG text fields by ID.")
     ap.add_argument("svg_path", type=Path, help="Path to the SVG file exported from Affinity")
     ap.add_argument("--title", help="New text for element with id='TITLE'")
     ap.add_argument("--description", help="New text for element with id='DESCRIPTION'")
     ap.add_argument("--out", type=Path, default=None,
                     help="Optional output path. If omitted, overwrites the input (after backup).")
+    ap.add_argument("--backup", action=argparse.BooleanOptionalAction, default=True,
+                    help="Keep a timestamped backup when overwriting the input (default: on).")
+    ap.add_argument("--streaming", action="store_true",
+                    help="Stream the SVG instead of loading it whole (lower memory on very large files).")
+    ap.add_argument("--pretty", action="store_true",
+                    help="Re-indent the output (slower on large files; the original layout is kept otherwise).")
     args = ap.parse_args()
 
     if not args.svg_path.exists():
@@ -193,36 +356,63 @@ def main():
         print("Nothing to do: provide --title and/or --description.", file=sys.stderr)
         sys.exit(1)
 
+    updates = {}
+    if args.title is not None:
+        updates["TITLE"] = args.title
+    if args.description is not None:
+        updates["DESCRIPTION"] = args.description
+
+    if args.streaming:
+        out_path = args.out if args.out else args.svg_path
+
+        def backup():
+            # Only once the stream has succeeded, so a failed run leaves no backup
+            bkp = backup_file(args.svg_path)
+            print(f"Backup written: {bkp.name}")
+
+        try:
+            found = stream_update(args.svg_path, out_path, updates,
+                                  before_replace=backup if args.out is None and args.backup else None)
+        except Exception as e:
+            print(f"ERROR processing SVG: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not found:
+            print("WARNING: No elements with id='TITLE' or id='DESCRIPTION' were found.", file=sys.stderr)
+        print(f"Saved: {out_path}")
+        return
+
     # Parse
     try:
-        tree = ET.parse(str(args.svg_path))
+        parser = etree.XMLParser(remove_blank_text=False, huge_tree=True)
+        tree = etree.parse(str(args.svg_path), parser)
         root = tree.getroot()
     except Exception as e:
         print(f"ERROR parsing SVG: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Update fields
-    updated_any = False
-    if args.title is not None:
-        updated_any |= set_text_by_id(root, "TITLE", args.title)
-    if args.description is not None:
-        updated_any |= set_text_by_id(root, "DESCRIPTION", args.description)
+    # Update fields (one walk, stops once both ids are found)
+    found = update_fields(root, updates)
 
-    if not updated_any:
+    if not found:
         print("WARNING: No elements with id='TITLE' or id='DESCRIPTION' were found.", file=sys.stderr)
 
     # Write output
     out_path = args.out if args.out else args.svg_path
-    if args.out is None:
+    if args.out is None and args.backup:
         bkp = backup_file(args.svg_path)
         print(f"Backup written: {bkp.name}")
 
     try:
-        if USE_LXML:
-            # Pretty print if lxml is available
-            tree.write(str(out_path), encoding="utf-8", xml_declaration=True, pretty_print=True)
-        else:
-            tree.write(str(out_path), encoding="utf-8", xml_declaration=True)
+        # Resolve symlinks so the file they point to is replaced, not the link itself
+        target = out_path.resolve()
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".svg")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                tree.write(f, encoding="utf-8", xml_declaration=True, pretty_print=args.pretty)
+            _replace_with(tmp_name, target, args.svg_path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
         print(f"Saved: {out_path}")
     except Exception as e:
         print(f"ERROR writing output: {e}", file=sys.stderr)